@@ -21,13 +21,25 @@ Features:
 """
 
 import os
+import argparse
+import fcntl
 import shutil
 import sys
 import logging
+import logging.handlers
+import atexit
 import datetime
+import json
+import re
 import smtplib
-import glob
+import gzip
+import io
 import subprocess
+import shlex
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.application import MIMEApplication
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import email.utils
@@ -39,10 +51,19 @@ import email.utils
 
 # 1) Allgemeine Einstellungen
 SCRIPT_NAME = "automated_borg_backup"   # Dient u.a. für den Log- und Lockfile-Namen
-# Neuer Pfad für unseren Skript-Temp-Ordner (enthält Lockfile, ggf. ZFS-Mounts usw.)
-SCRIPT_TMP_DIR = "/tmp/my_backup_tempdir"
+# Pfad für unseren Skript-Arbeitsordner (enthält Lockfile, ggf. ZFS-Mounts usw.).
+# Liegt auf einem persistenten Pfad (nicht tmpfs), damit Daten, die über Läufe hinweg
+# erhalten bleiben sollen, nicht bei jedem Neustart verloren gehen.
+SCRIPT_TMP_DIR = "/var/lib/automated_borg_backup/run"
 
 LOCKFILE_PATH = os.path.join(SCRIPT_TMP_DIR, f".lock")
+# Einträge in SCRIPT_TMP_DIR, die nur für einen Lauf gebraucht und am Ende entfernt werden
+TMP_DIR_RUN_ENTRIES = {"zfs"}
+# Zähler für VERIFY_DATA_EVERY_N_RUNS (im übergeordneten Ordner von SCRIPT_TMP_DIR)
+VERIFY_COUNTER_PATH = os.path.join(os.path.dirname(SCRIPT_TMP_DIR), "verify_counter")
+# Marker des letzten erfolgreichen Laufs für --if-changed (mtime = Startzeit des Laufs),
+# ebenfalls im übergeordneten Ordner von SCRIPT_TMP_DIR
+LAST_SUCCESS_PATH = os.path.join(os.path.dirname(SCRIPT_TMP_DIR), "last_success")
 
 # Logging-Einstellungen
 LOG_DIR = "/var/log/automated_borg_backup"  # Ordner, in dem die Logfiles erstellt werden
@@ -55,6 +76,7 @@ BACKUP_NAME_PREFIX = "linux-backup"
 SMTP_SERVER = "mail.myserver.de"
 SMTP_PORT = 587
 SMTP_USE_TLS = True
+SMTP_TIMEOUT = 30  # Sekunden
 SMTP_USERNAME = "from@example.com"
 SMTP_PASSWORD = "SecureSMTPPassword"
 EMAIL_FROM_ADDRESS = "from@example.com"
@@ -69,6 +91,10 @@ EMAIL_RECIPIENTS = [
 # Wenn False, wird immer eine E-Mail verschickt (unabhängig vom Ergebnis).
 EMAIL_ERROR_ONLY_MODE = False
 
+# Das Log wird immer als gzip-Anhang mitgeschickt. Ist es kleiner als dieser Wert (in Bytes),
+# steht es zusätzlich direkt im Mail-Text.
+EMAIL_INLINE_LOG_MAX_BYTES = 64 * 1024
+
 # 3) Borg-Repositories
 # "ssh_key" kann None oder ein Pfad (z.B. "/root/.ssh/id_ed25519") sein.
 BORG_REPOSITORIES = [
@@ -101,9 +127,23 @@ PRUNE_KEEP_YEARLY = 2
 # 7) Soll nach dem Prune ein "borg compact" ausgeführt werden?
 ENABLE_BORG_COMPACT = True
 
-# 8) Sollen in der Überprüfung (borg check) die Datenblöcke verifiziert werden?
-# (Parameter: --verify-data)
-CHECK_WITH_VERIFY_DATA = True
+# 8) Wie oft sollen in der Überprüfung (borg check) die Datenblöcke verifiziert werden?
+# Bei jedem N-ten Lauf wird "borg check --verify-data" ausgeführt (liest das komplette
+# Repository), bei allen anderen Läufen nur das günstige "borg check --repository-only".
+# 1 = bei jedem Lauf, 0 = nie.
+VERIFY_DATA_EVERY_N_RUNS = 7
+
+# 9) Anzahl der letzten stderr-Zeilen eines Befehls, die bei einem Fehler
+# zusätzlich als ERROR geloggt werden (die komplette Ausgabe steht immer im DEBUG-Log).
+COMMAND_STDERR_TAIL_LINES = 20
+
+# 10) Borg-Cache (enthält u.a. den Files-Cache, mit dem borg unveränderte Dateien
+# erkennt, ohne sie erneut zu lesen). Sollte auf einem persistenten Pfad liegen
+# (nicht /tmp), damit er über Läufe hinweg erhalten bleibt.
+BORG_CACHE_DIR = "/var/cache/borg"
+# Nach wie vielen Läufen, in denen eine Datei nicht gesehen wurde, ihr Eintrag
+# aus dem Files-Cache entfernt wird (BORG_FILES_CACHE_TTL).
+BORG_FILES_CACHE_TTL = 20
 
 
 # =============================================================================
@@ -111,8 +151,10 @@ CHECK_WITH_VERIFY_DATA = True
 # =============================================================================
 
 logger = None
+lock_fd = None  # Dateideskriptor des per flock gehaltenen Lockfiles
 backup_success = True   # Wird auf False gesetzt, sobald ein Fehler auftritt
 backup_fail_reasons = []  # Liste von Fehlerursachen (z.B. "Prune failed")
+state_lock = threading.Lock()  # Schützt backup_success/backup_fail_reasons bei parallelen Repo-Jobs
 start_time = datetime.datetime.now()
 
 
@@ -120,6 +162,54 @@ start_time = datetime.datetime.now()
 # ============================= HILFSFUNKTIONEN ===============================
 # =============================================================================
 
+class JsonLineFormatter(logging.Formatter):
+    """
+    Formatiert jeden Log-Eintrag als eine JSON-Zeile ({"ms": ..., "lvl": ..., "msg": ...}),
+    damit die Logdatei ohne Regex maschinell auswertbar ist.
+    "ms" sind die Millisekunden seit Skriptstart (relativeCreated), so entfällt die
+    Datums-Formatierung pro Eintrag. Die absolute Startzeit steht im ersten Eintrag.
+    """
+
+    def format(self, record):
+        entry = {
+            "ms": int(record.relativeCreated),
+            "lvl": record.levelname,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler, der pro Eintrag nur in den Datei-Puffer schreibt und erst bei flush()
+    auf die Platte durchreicht. Als Ziel eines MemoryHandlers wird so pro Puffer-Flush
+    nur einmal geschrieben statt einmal pro Eintrag.
+    """
+
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class BatchMemoryHandler(logging.handlers.MemoryHandler):
+    """
+    MemoryHandler, der nach dem Abarbeiten des Puffers einmal target.flush() aufruft
+    (der Standard-MemoryHandler tut das nicht).
+    """
+
+    def flush(self):
+        super().flush()
+        with self.lock:
+            if self.target:
+                self.target.flush()
+
+
 def setup_logging():
     """
     Initialisiert das Logging-System. Für jeden Skriptlauf wird eine neue Logdatei erstellt.
@@ -139,11 +229,17 @@ def setup_logging():
     # Formatter
     formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
 
-    # File Handler
-    fh = logging.FileHandler(logfile_path)
+    # File Handler (JSON-Zeilen), gepuffert über einen MemoryHandler: Die Einträge werden
+    # gesammelt geschrieben (alle 512 Einträge, bei ERROR sofort und vor dem E-Mail-Versand).
+    # BufferedFileHandler flusht nicht pro Eintrag, sondern nur einmal pro MemoryHandler-Flush.
+    fh = BufferedFileHandler(logfile_path)
     fh.setLevel(logging.DEBUG)
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
+    fh.setFormatter(JsonLineFormatter())
+    mh = BatchMemoryHandler(capacity=512, flushLevel=logging.ERROR, target=fh)
+    mh.setLevel(logging.DEBUG)
+    logger.addHandler(mh)
+    atexit.register(fh.close)
+    atexit.register(mh.close)
 
     # Optional: Stream Handler (Konsole)
     sh = logging.StreamHandler(sys.stdout)
@@ -152,16 +248,33 @@ def setup_logging():
     logger.addHandler(sh)
 
     logger.info("==============================================")
-    logger.info("Backup-Skript startet...")
+    logger.info(f"Backup-Skript startet... ({start_time})")
     logger.info("Log-Datei: %s", logfile_path)
 
     return logfile_path
 
 
+def discard_logfile(logfile_path):
+    """
+    Schließt den Datei-Handler des Loggers und löscht die Logdatei dieses Laufs.
+    Weitere Einträge gehen nur noch auf die Konsole.
+    """
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.MemoryHandler):
+            target = handler.target
+            logger.removeHandler(handler)
+            handler.close()
+            if target is not None:
+                target.close()
+    try:
+        os.remove(logfile_path)
+    except OSError as e:
+        logger.warning(f"Konnte Logdatei {logfile_path} nicht löschen: {e}")
+
+
 def check_script_tmp_dir(logfile_path):
     """
-    Prüft, ob der Skript-Temp-Ordner existiert, legt ihn ggf. an und
-    wirft einen Fehler, falls er nicht leer ist.
+    Prüft, ob der Skript-Temp-Ordner existiert, und legt ihn ggf. an.
     """
     if not os.path.exists(SCRIPT_TMP_DIR):
         try:
@@ -175,66 +288,113 @@ def check_script_tmp_dir(logfile_path):
                 logfile_path
             )
             sys.exit(1)
-    # Wenn Verzeichnis existiert, prüfen ob leer
-    if os.listdir(SCRIPT_TMP_DIR):
-        # Wenn nicht leer -> Fehler
-        logger.error(f"Der Ordner {SCRIPT_TMP_DIR} ist nicht leer. Abbruch.")
-        send_email(
-            "[BorgBackup] FAILED: TMP Folder not empty",
-            f"The backup script did not start because the tmp folder ({SCRIPT_TMP_DIR}) is not empty. This may be caused by the script already running or not shutting down correctly.",
-            logfile_path
-        )
-        sys.exit(1)
 
 
 def acquire_lock_or_exit(logfile_path):
     """
     Sorgt dafür, dass das Skript nur einmal zur gleichen Zeit ausgeführt wird.
-    Erzeugt eine Lock-Datei und beendet sich, wenn es die Lock-Datei bereits gibt.
+    Öffnet (bzw. erzeugt) die Lock-Datei und sperrt sie per flock. Hält bereits ein
+    anderer Prozess die Sperre, beendet sich das Skript. Da der Kernel die Sperre beim
+    Prozessende automatisch freigibt, blockiert ein liegengebliebenes Lockfile eines
+    abgebrochenen Laufs keine weiteren Läufe.
     """
-    if os.path.exists(LOCKFILE_PATH):
-        # Lockfile existiert bereits
-        logger.error("Lockfile existiert bereits. Ein weiteres Ausführen ist nicht erlaubt.")
+    global lock_fd
+
+    try:
+        fd = os.open(LOCKFILE_PATH, os.O_CREAT | os.O_RDWR, 0o644)
+    except Exception as e:
+        logger.error(f"Lockfile konnte nicht erstellt werden: {e}")
         send_email(
-            "[BorgBackup] FAILED: Backup Already Running",
-            f"The backup script did not start because a lockfile already exists at {LOCKFILE_PATH}.",
+            "[BorgBackup] FAILED: Unable to create lock file",
+            f"The backup script did not start because the lockfile cant be created at {LOCKFILE_PATH}.",
             logfile_path
         )
         sys.exit(1)
-    else:
-        # Lockfile erstellen
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        # Lock wird von einem anderen laufenden Prozess gehalten
         try:
-            with open(LOCKFILE_PATH, 'w') as lockfile:
-                lockfile.write(str(os.getpid()))
-            logger.debug(f"Lockfile erstellt: {LOCKFILE_PATH}")
-        except Exception as e:
-            logger.error(f"Lockfile konnte nicht erstellt werden: {e}")
-            send_email(
-                "[BorgBackup] FAILED: Unable to create lock file",
-                f"The backup script did not start because the lockfile cant be created at {LOCKFILE_PATH}.",
-                logfile_path
-            )
-            sys.exit(1)
+            other_pid = os.read(fd, 32).decode("utf-8", errors="replace").strip() or "unbekannt"
+        except OSError:
+            other_pid = "unbekannt"
+        os.close(fd)
+        logger.error(f"Das Skript läuft bereits (PID {other_pid}). Ein weiteres Ausführen ist nicht erlaubt.")
+        send_email(
+            "[BorgBackup] FAILED: Backup Already Running",
+            f"The backup script did not start because another instance (PID {other_pid}) holds the lock at {LOCKFILE_PATH}.",
+            logfile_path
+        )
+        sys.exit(1)
+
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    lock_fd = fd
+    logger.debug(f"Lock gesetzt: {LOCKFILE_PATH}")
 
 
 def release_lock():
     """
-    Entfernt das Lockfile am Ende des Skripts.
+    Gibt die Sperre am Ende des Skripts frei.
+    Das Lockfile selbst bleibt bestehen: Würde es gelöscht, könnte ein wartender Prozess
+    noch die alte (gelöschte) Datei sperren, während ein weiterer eine neue anlegt und
+    sperrt, und beide liefen gleichzeitig. Ein liegengebliebenes Lockfile stört nicht,
+    da nur die flock-Sperre zählt.
     """
-    if os.path.exists(LOCKFILE_PATH):
-        try:
-            os.remove(LOCKFILE_PATH)
-            logger.debug("Lockfile entfernt.")
-        except Exception as e:
-            logger.error(f"Lockfile konnte nicht entfernt werden: {e}")
+    global lock_fd
+
+    if lock_fd is None:
+        return
+    try:
+        os.ftruncate(lock_fd, 0)
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+        logger.debug("Lock freigegeben.")
+    except Exception as e:
+        logger.error(f"Lock konnte nicht freigegeben werden: {e}")
+    finally:
+        lock_fd = None
+
+
+def record_failure(reason):
+    """
+    Markiert den Lauf als fehlgeschlagen und merkt sich die Fehlerursache.
+    Thread-sicher, da die Repo-Jobs parallel laufen.
+    """
+    global backup_success
+
+    with state_lock:
+        backup_success = False
+        backup_fail_reasons.append(reason)
+
+
+def run_for_all_repos(func, *args):
+    """
+    Führt func(repo, *args) für alle BORG_REPOSITORIES parallel aus
+    (ein Thread pro Repository) und wartet, bis alle fertig sind.
+    Gibt ein Dict {repo_url: Rückgabewert von func} zurück.
+    Exceptions aus den Threads werden an den Aufrufer weitergereicht.
+    """
+    if not BORG_REPOSITORIES:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(BORG_REPOSITORIES)) as executor:
+        futures = {repo["repo_url"]: executor.submit(func, repo, *args) for repo in BORG_REPOSITORIES}
+        return {repo_url: future.result() for repo_url, future in futures.items()}
 
 
 def send_email(subject, body_text, log_file_path):
     """
     Versendet eine E-Mail an die konfigurierten Empfänger.
-    Der Mail-Body enthält eine Kurzzusammenfassung und das gesamte Log.
-    Nach jedem Log-Eintrag wird eine Leerzeile eingefügt.
+    Der Mail-Body enthält eine Kurzzusammenfassung und (falls kleiner als
+    EMAIL_INLINE_LOG_MAX_BYTES) das gesamte Log. Das Log wird außerdem immer
+    gzip-komprimiert angehängt. Es wird dafür als Bytes in 1-MiB-Blöcken gelesen
+    (ohne Dekodierung), damit auch sehr große Logs nicht komplett im Speicher landen.
     """
+    # Gepufferte Log-Einträge in die Logdatei schreiben, bevor sie gelesen wird
+    for handler in logger.handlers:
+        handler.flush()
+
     # MIME Konstruktion
     msg = MIMEMultipart()
     msg["From"] = f"{EMAIL_FROM_NAME} <{EMAIL_FROM_ADDRESS}>"
@@ -242,46 +402,77 @@ def send_email(subject, body_text, log_file_path):
     msg["Subject"] = subject
     msg["Date"] = email.utils.formatdate(localtime=True)
 
-    # Logfile-Inhalt auslesen
+    # Logfile komprimieren und ggf. inline auslesen
+    log_attachment = None
     try:
-        with open(log_file_path, "r") as lf:
-            log_content = lf.read()
+        if os.path.getsize(log_file_path) < EMAIL_INLINE_LOG_MAX_BYTES:
+            with open(log_file_path, "r", errors="replace") as lf:
+                log_content = lf.read()
+        else:
+            log_content = "[Vollständiges Log als .gz angehängt]"
+
+        with io.BytesIO() as buf:
+            with open(log_file_path, "rb") as lf, gzip.GzipFile(fileobj=buf, mode="wb") as gz:
+                shutil.copyfileobj(lf, gz, length=1 << 20)
+            log_attachment = MIMEApplication(buf.getvalue(), "gzip", name=f"{SCRIPT_NAME}.log.gz")
+        log_attachment["Content-Disposition"] = f'attachment; filename="{SCRIPT_NAME}.log.gz"'
     except Exception as e:
         log_content = f"Fehler beim Lesen des Logfiles: {e}"
 
-    # Nach jedem Zeilenumbruch eine Leerzeile einfügen
-    log_content = log_content.replace("\n", "\n\n")
-
     # Body aufbauen
-    body = body_text
-    body += "\n\n--- Vollständiges Log ---\n\n"
-    body += log_content
+    body = "\n\n--- Vollständiges Log ---\n\n".join((body_text, log_content))
 
     msg.attach(MIMEText(body, "plain", "utf-8"))
+    if log_attachment is not None:
+        msg.attach(log_attachment)
 
-    # SMTP-Verbindung herstellen und Mail senden
+    # SMTP-Verbindung herstellen und Mail senden.
+    # send_message serialisiert die Mail direkt per BytesGenerator in Bytes
+    # (keine zusätzliche str-Kopie wie bei msg.as_string()).
     try:
-        if SMTP_USE_TLS:
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-            server.starttls()
-        else:
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.sendmail(EMAIL_FROM_ADDRESS, EMAIL_RECIPIENTS, msg.as_string())
-        server.quit()
+        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT) as server:
+            server.ehlo()
+            if SMTP_USE_TLS:
+                server.starttls()
+                server.ehlo()
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+            server.send_message(msg, from_addr=EMAIL_FROM_ADDRESS, to_addrs=EMAIL_RECIPIENTS)
         logger.info("E-Mail wurde erfolgreich versendet.")
     except Exception as e:
         logger.error(f"Fehler beim Versenden der E-Mail: {e}")
 
 
-def run_command(command, passphrase=None, ssh_key=None):
+def _stream_output(pipe, prefix, label, collected=None):
+    """
+    Liest die Ausgabe eines Prozesses zeilenweise und schreibt sie direkt ins Log,
+    statt sie komplett im Speicher zu puffern.
+    prefix kennzeichnet den Prozess (Befehl, Repo, PID), damit sich die Zeilen parallel
+    laufender Befehle im Log auseinanderhalten lassen.
+    Ist collected gesetzt (Liste oder deque), werden die Zeilen zusätzlich dort abgelegt.
+    """
+    for raw_line in iter(pipe.readline, b''):
+        line = raw_line.decode('utf-8', errors='replace').rstrip()
+        logger.debug(f"{prefix} {label}: {line}")
+        if collected is not None:
+            collected.append(line)
+    pipe.close()
+
+
+def run_command(argv, passphrase=None, ssh_key=None, capture_stdout=False, log_label=None):
     """
-    Führt einen Shell-Befehl aus und gibt den Rückgabecode, stdout und stderr zurück.
+    Führt einen Befehl (als Argument-Liste, ohne Shell) aus und gibt den Rückgabecode,
+    stdout und stderr zurück.
+    stdout und stderr werden während der Ausführung zeilenweise ins DEBUG-Log gestreamt.
+    stdout wird nur bei capture_stdout=True gesammelt zurückgegeben (sonst ""),
+    von stderr werden nur die letzten COMMAND_STDERR_TAIL_LINES Zeilen zurückgegeben.
+    Jede geloggte Zeile trägt ein Präfix aus Befehl, log_label (z.B. der Repo-URL) und PID.
+    Setzt BORG_CACHE_DIR und BORG_FILES_CACHE_TTL aus der Konfiguration.
     Setzt ggf. BORG_PASSPHRASE, falls passphrase != None.
     Setzt ggf. BORG_RSH="ssh -i <ssh_key>", falls ssh_key != None.
     """
     env = os.environ.copy()
+    env["BORG_CACHE_DIR"] = BORG_CACHE_DIR
+    env["BORG_FILES_CACHE_TTL"] = str(BORG_FILES_CACHE_TTL)
 
     if passphrase is not None:
         env["BORG_PASSPHRASE"] = passphrase
@@ -294,42 +485,191 @@ def run_command(command, passphrase=None, ssh_key=None):
         if "BORG_RSH" in env:
             del env["BORG_RSH"]
 
-    logger.debug(f"Führe Command aus: {command}")
+    command_str = shlex.join(argv)
+    logger.debug(f"Führe Command aus: {command_str}")
+
+    stdout_lines = [] if capture_stdout else None
+    stderr_tail = deque(maxlen=COMMAND_STDERR_TAIL_LINES)
 
     process = subprocess.Popen(
-        command,
-        shell=True,
+        argv,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         env=env
     )
-    stdout, stderr = process.communicate()
-    returncode = process.returncode
+    prefix = " ".join(argv[:2])
+    if log_label is not None:
+        prefix += f" {log_label}"
+    prefix = f"[{prefix} PID {process.pid}]"
+    logger.debug(f"{prefix} gestartet")
+
+    readers = [
+        threading.Thread(target=_stream_output, args=(process.stdout, prefix, "stdout", stdout_lines)),
+        threading.Thread(target=_stream_output, args=(process.stderr, prefix, "stderr", stderr_tail)),
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    returncode = process.wait()
+
+    stdout = "\n".join(stdout_lines) if capture_stdout else ""
+    stderr = "\n".join(stderr_tail)
 
     if returncode == 0:
-        logger.debug(f"Command erfolgreich: {command}")
+        logger.debug(f"{prefix} Command erfolgreich: {command_str}")
     else:
-        logger.error(f"Command fehlgeschlagen (Code {returncode}): {command}")
-        logger.error(f"stderr: {stderr.decode('utf-8').strip()}")
+        logger.error(f"{prefix} Command fehlgeschlagen (Code {returncode}): {command_str}")
+        logger.error(f"{prefix} stderr: {stderr}")
 
-    # Log stdout und stderr
-    if stdout:
-        logger.debug(f"stdout:\n{stdout.decode('utf-8').strip()}")
-    if stderr:
-        logger.debug(f"stderr:\n{stderr.decode('utf-8').strip()}")
+    return returncode, stdout, stderr
 
-    return returncode, stdout.decode('utf-8'), stderr.decode('utf-8')
 
+def read_zfs_mounts():
+    """
+    Liest /proc/self/mountinfo einmal ein und gibt alle ZFS-Mounts als
+    Dict {mountpoint: source} zurück (source z.B. "tank@backup-snapshot_...").
+    """
+    def unescape(value):
+        # mountinfo kodiert Leerzeichen usw. oktal, z.B. "\040"
+        return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), value)
 
-def create_zfs_snapshots_and_mount(zfs_pools):
+    mounts = {}
+    try:
+        with open("/proc/self/mountinfo", "r") as mountinfo:
+            for line in mountinfo:
+                # <id> <parent> <maj:min> <root> <mountpoint> <opts> [optional...] - <fstype> <source> <superopts>
+                left, separator, right = line.partition(" - ")
+                left_fields = left.split()
+                right_fields = right.split()
+                if not separator or len(left_fields) < 5 or len(right_fields) < 2:
+                    continue
+                if right_fields[0] != "zfs":
+                    continue
+                mounts[unescape(left_fields[4])] = unescape(right_fields[1])
+    except OSError as e:
+        logger.warning(f"Konnte /proc/self/mountinfo nicht lesen: {e}")
+    return mounts
+
+
+def snapshot_index(datasets):
+    """
+    Liest die vorhandenen Snapshots der angegebenen Datasets mit einem einzigen
+    "zfs list"-Aufruf ein und gibt sie als Dict {dataset: {snapshotname, ...}} zurück.
+    Wird genutzt, um liegengebliebene Snapshots abgebrochener Läufe zu finden,
+    ohne pro Pool erneut "zfs list" aufzurufen.
+    Kann die Liste nicht gelesen werden, wird ein leeres Dict zurückgegeben.
     """
-    Erstellt für jeden Pool in zfs_pools einen Snapshot (nicht rekursiv),
-    mountet diesen read-only in SCRIPT_TMP_DIR/zfs/<POOLNAME>.
+    index = {dataset: set() for dataset in datasets}
+    if not datasets:
+        return index
+
+    # -d 1: nur die Snapshots der Datasets selbst, keine Kind-Datasets (nicht rekursiv)
+    rc, out, err = run_command(
+        ["zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-d", "1", *datasets],
+        capture_stdout=True
+    )
+    if rc != 0:
+        logger.warning("Konnte vorhandene ZFS-Snapshots nicht auflisten.")
+        return index
+
+    for line in out.splitlines():
+        if "@" not in line:
+            continue
+        dataset, snapshot = line.split("@", 1)
+        index.setdefault(dataset, set()).add(snapshot)
+    return index
+
+
+def destroy_zfs_snapshots(snap_names):
+    """
+    Zerstört die angegebenen Snapshots ("<dataset>@<snapshot>").
+    Snapshots desselben Datasets werden in einem einzigen Aufruf
+    (zfs destroy <dataset>@<snap1>,<snap2>,...) zerstört.
+    """
+    snapshots_by_dataset = {}
+    for snap_name in snap_names:
+        dataset, snapshot = snap_name.split("@", 1)
+        snapshots_by_dataset.setdefault(dataset, []).append(snapshot)
+
+    for dataset, snapshots in snapshots_by_dataset.items():
+        target = f"{dataset}@{','.join(snapshots)}"
+        rc, out, err = run_command(["zfs", "destroy", target])
+        if rc != 0:
+            logger.error(f"ZFS Destroy fehlgeschlagen für {target}")
+            record_failure(f"ZFS Destroy fehlgeschlagen für {target}")
+
+
+def cleanup_stale_backup_snapshots(zfs_pools, existing_snapshots, zfs_base_dir):
+    """
+    Räumt Reste abgebrochener Läufe auf: Unter zfs_base_dir noch gemountete
+    "backup-snapshot_*"-Snapshots dieses Skripts werden ausgehängt, leere Mountpoints
+    entfernt und alle liegengebliebenen Backup-Snapshots der zfs_pools zerstört.
+    existing_snapshots ist das Ergebnis von snapshot_index().
+    """
+    base_dir = os.path.realpath(zfs_base_dir)
+    stale_snapshots = []
+
+    # 1) Eigene, noch gemountete Snapshots aus zfs_base_dir aushängen
+    still_mounted = set()
+    for mount_point, source in read_zfs_mounts().items():
+        if "@backup-snapshot_" not in source:
+            continue
+        if os.path.dirname(mount_point) != base_dir:
+            # Nicht von uns gemountet, nicht anfassen
+            still_mounted.add(source)
+            continue
+        logger.warning(f"Alter Backup-Snapshot {source} ist noch unter {mount_point} gemountet, hänge ihn aus.")
+        rc, out, err = run_command(["umount", mount_point])
+        if rc != 0:
+            logger.error(f"Unmount fehlgeschlagen für {mount_point}. Manuelles Aufräumen nötig?")
+            record_failure(f"Unmount fehlgeschlagen für {mount_point}")
+            still_mounted.add(source)
+            continue
+        try:
+            os.rmdir(mount_point)
+        except OSError as e:
+            logger.warning(f"Konnte Mountpoint {mount_point} nicht entfernen: {e}")
+        if source.split("@", 1)[0] in zfs_pools:
+            stale_snapshots.append(source)
+
+    # 2) Leere Mountpoints abgebrochener Läufe entfernen
+    for pool in zfs_pools:
+        mount_point = os.path.join(zfs_base_dir, pool.replace("/", "_"))
+        if os.path.isdir(mount_point) and not os.path.ismount(mount_point):
+            try:
+                os.rmdir(mount_point)
+            except OSError:
+                pass
+
+    # 3) Liegengebliebene Snapshots zerstören
+    for pool in zfs_pools:
+        for snapshot in sorted(existing_snapshots.get(pool, ())):
+            if not snapshot.startswith("backup-snapshot_"):
+                continue
+            snap_name = f"{pool}@{snapshot}"
+            if snap_name in still_mounted:
+                logger.warning(f"Alter Backup-Snapshot {snap_name} ist noch gemountet und wird nicht zerstört.")
+                continue
+            if snap_name not in stale_snapshots:
+                stale_snapshots.append(snap_name)
+
+    if stale_snapshots:
+        logger.warning(f"Zerstöre alte Backup-Snapshots aus abgebrochenen Läufen: {', '.join(stale_snapshots)}")
+        destroy_zfs_snapshots(stale_snapshots)
+
+
+def create_zfs_snapshots_and_mount(zfs_pools, existing_snapshots):
+    """
+    Erstellt für alle Pools in zfs_pools mit einem einzigen "zfs snapshot"-Aufruf
+    je einen Snapshot (nicht rekursiv) und mountet diese read-only in
+    SCRIPT_TMP_DIR/zfs/<POOLNAME>. Scheitert der gemeinsame Aufruf, werden die
+    Snapshots einzeln erstellt, damit nur die fehlerhaften Pools fehlen.
+    existing_snapshots ist das Ergebnis von snapshot_index(). Liegengebliebene
+    Backup-Snapshots (und deren Mounts) abgebrochener Läufe werden vorher aufgeräumt.
     Gibt eine Liste von Dicts zurück, damit wir diese Snapshots später
     wieder aushängen und löschen können.
     """
-    global backup_success
-
     snapshot_info = []
     if not zfs_pools:
         return snapshot_info
@@ -343,20 +683,42 @@ def create_zfs_snapshots_and_mount(zfs_pools):
         os.makedirs(zfs_base_dir, exist_ok=True)
     except Exception as e:
         logger.error(f"Konnte {zfs_base_dir} nicht erstellen: {e}")
-        backup_success = False
-        backup_fail_reasons.append(f"Konnte {zfs_base_dir} nicht erstellen")
+        record_failure(f"Konnte {zfs_base_dir} nicht erstellen")
         return snapshot_info
 
-    for pool in zfs_pools:
-        snap_name = f"{pool}@backup-snapshot_{timestamp_str}"
+    snap_names = {pool: f"{pool}@backup-snapshot_{timestamp_str}" for pool in zfs_pools}
+
+    # 0) Reste abgebrochener Läufe aufräumen
+    cleanup_stale_backup_snapshots(zfs_pools, existing_snapshots, zfs_base_dir)
+
+    # 1) Alle Snapshots in einem Aufruf erstellen (atomar: alle oder keiner)
+    snapshotted_pools = list(zfs_pools)
+    rc, out, err = run_command(["zfs", "snapshot", *snap_names.values()])
+    if rc != 0:
+        # Ein einzelner fehlerhafter Pool lässt den gemeinsamen Aufruf komplett scheitern.
+        # Damit die übrigen Pools trotzdem gesichert werden, einzeln wiederholen.
+        logger.warning("Gemeinsamer Snapshot aller Pools fehlgeschlagen, versuche die Pools einzeln...")
+        for pool in zfs_pools:
+            rc, out, err = run_command(["zfs", "snapshot", snap_names[pool]])
+            if rc != 0:
+                logger.error(f"Snapshot fehlgeschlagen für {snap_names[pool]}")
+                record_failure(f"Snapshot fehlgeschlagen für {snap_names[pool]}")
+                snapshotted_pools.remove(pool)
+
+    mounted = read_zfs_mounts()
+
+    failed_snapshots = []
+    for pool in snapshotted_pools:
+        snap_name = snap_names[pool]
         mount_point = os.path.join(zfs_base_dir, pool.replace("/", "_"))  # "/" darf im Pfad nicht direkt sein
-        # 1) Snapshot erstellen
-        cmd_snapshot = f"zfs snapshot {snap_name}"
-        rc, out, err = run_command(cmd_snapshot)
-        if rc != 0:
-            logger.error(f"Snapshot fehlgeschlagen für {snap_name}")
-            backup_fail_reasons.append(f"Snapshot fehlgeschlagen für {snap_name}")
-            backup_success = False
+
+        # Eigene alte Mounts wurden oben bereits ausgehängt, hier bleibt nur Fremdes übrig
+        mounted_source = mounted.get(os.path.realpath(mount_point))
+        if mounted_source is not None:
+            logger.error(f"Mountpoint {mount_point} ist noch durch {mounted_source} belegt. Manuelles Aufräumen nötig?")
+            record_failure(f"Mountpoint {mount_point} ist noch durch {mounted_source} belegt")
+            # Snapshot wird unten wieder gelöscht
+            failed_snapshots.append(snap_name)
             continue
 
         # 2) Mountpoint anlegen
@@ -364,21 +726,18 @@ def create_zfs_snapshots_and_mount(zfs_pools):
             os.makedirs(mount_point, exist_ok=False)
         except Exception as e:
             logger.error(f"Konnte Mountpoint {mount_point} nicht erstellen: {e}")
-            backup_success = False
-            backup_fail_reasons.append(f"Konnte Mountpoint {mount_point} nicht erstellen")
-            # Snapshot ggf. wieder löschen
-            run_command(f"zfs destroy {snap_name}")
+            record_failure(f"Konnte Mountpoint {mount_point} nicht erstellen")
+            # Snapshot wird unten wieder gelöscht
+            failed_snapshots.append(snap_name)
             continue
 
         # 3) Snapshot read-only mounten
-        cmd_mount = f"mount -t zfs -o ro {snap_name} {mount_point}"
-        rc, out, err = run_command(cmd_mount)
+        rc, out, err = run_command(["mount", "-t", "zfs", "-o", "ro", snap_name, mount_point])
         if rc != 0:
             logger.error(f"Mount fehlgeschlagen für {snap_name}")
-            backup_success = False
-            backup_fail_reasons.append(f"Mount fehlgeschlagen für {snap_name}")
-            # Snapshot wieder löschen
-            run_command(f"zfs destroy {snap_name}")
+            record_failure(f"Mount fehlgeschlagen für {snap_name}")
+            # Snapshot wird unten wieder gelöscht
+            failed_snapshots.append(snap_name)
             # Mountpoint wieder entfernen
             try:
                 os.rmdir(mount_point)
@@ -394,55 +753,109 @@ def create_zfs_snapshots_and_mount(zfs_pools):
         })
         logger.info(f"Snapshot erstellt und gemountet: {snap_name} -> {mount_point}")
 
+    # Snapshots, die nicht gemountet werden konnten, wieder löschen
+    if failed_snapshots:
+        destroy_zfs_snapshots(failed_snapshots)
+
     return snapshot_info
 
 
 def unmount_and_destroy_zfs_snapshots(snapshot_info):
     """
-    Hängt alle zuvor erstellten Snapshots aus und zerstört sie.
+    Hängt alle zuvor erstellten Snapshots aus und zerstört sie anschließend
+    gesammelt (ein "zfs destroy" pro Dataset).
     """
-    global backup_success
-
     if not snapshot_info:
         return
     logger.info("Starte Unmount und Zerstörung aller ZFS-Snapshots...")
 
+    # 1) unmount
+    mounted = read_zfs_mounts()
+    unmounted_snapshots = []
     for info in snapshot_info:
         snap_name = info["snapshot"]
         mount_point = info["mountpoint"]
-        # 1) unmount
-        cmd_umount = f"umount {mount_point}"
-        rc, out, err = run_command(cmd_umount)
+        if mounted.get(os.path.realpath(mount_point)) != snap_name:
+            logger.warning(f"Snapshot {snap_name} ist nicht (mehr) unter {mount_point} gemountet, überspringe Unmount.")
+            rc = 0
+        else:
+            rc, out, err = run_command(["umount", mount_point])
         if rc != 0:
             logger.error(f"Unmount fehlgeschlagen für {mount_point}. Manuelles Aufräumen nötig?")
-            backup_fail_reasons.append(f"Unmount fehlgeschlagen für {mount_point}")
-            backup_success = False
-        else:
-            # Mountpoint Ordner löschen
-            try:
-                os.rmdir(mount_point)
-            except OSError as e:
-                logger.warning(f"Konnte Mountpoint {mount_point} nicht entfernen: {e}")
+            record_failure(f"Unmount fehlgeschlagen für {mount_point}")
+            logger.error(f"Snapshot {snap_name} ist noch gemountet und wird nicht zerstört.")
+            continue
+
+        # Mountpoint Ordner löschen
+        try:
+            os.rmdir(mount_point)
+        except OSError as e:
+            logger.warning(f"Konnte Mountpoint {mount_point} nicht entfernen: {e}")
+        unmounted_snapshots.append(snap_name)
+
+    # 2) snapshot destroy
+    if unmounted_snapshots:
+        destroy_zfs_snapshots(unmounted_snapshots)
+
 
-        # 2) snapshot destroy
-        cmd_destroy = f"zfs destroy {snap_name}"
-        rc, out, err = run_command(cmd_destroy)
+def sources_changed():
+    """
+    Prüft für --if-changed, ob sich seit dem letzten erfolgreichen Lauf (LAST_SUCCESS_PATH)
+    etwas an den zu sichernden Daten geändert hat:
+    - BACKUP_DIRECTORIES: "find -cnewer" bricht beim ersten geänderten Eintrag ab.
+    - ZFS_POOLS gelten immer als geändert, da es keine zuverlässige, billige Prüfung gibt
+      (die Backup-Snapshots werden nach jedem Lauf zerstört).
+    Im Zweifel (kein Marker, Fehler beim Prüfen) wird True zurückgegeben.
+    """
+    if not os.path.exists(LAST_SUCCESS_PATH):
+        logger.info("Kein erfolgreicher Lauf bekannt, Backup wird ausgeführt.")
+        return True
+
+    if ZFS_POOLS:
+        logger.info("ZFS-Pools sind konfiguriert und gelten immer als geändert, Backup wird ausgeführt.")
+        return True
+
+    if BACKUP_DIRECTORIES:
+        rc, out, err = run_command(
+            ["find", *BACKUP_DIRECTORIES, "-cnewer", LAST_SUCCESS_PATH, "-print", "-quit"],
+            capture_stdout=True
+        )
         if rc != 0:
-            logger.error(f"ZFS Destroy fehlgeschlagen für {snap_name}")
-            backup_fail_reasons.append(f"ZFS Destroy fehlgeschlagen für {snap_name}")
-            backup_success = False
+            logger.warning("Änderungsprüfung der Verzeichnisse fehlgeschlagen, Backup wird ausgeführt.")
+            return True
+        if out.strip():
+            logger.info(f"Geänderte Datei gefunden: {out.strip()}")
+            return True
+
+    return False
+
+
+def write_last_success():
+    """
+    Schreibt den Marker für den letzten erfolgreichen Lauf (für --if-changed).
+    Die mtime wird auf die Startzeit des Laufs gesetzt, damit auch Änderungen
+    während des Backups beim nächsten Lauf erkannt werden.
+    """
+    try:
+        with open(LAST_SUCCESS_PATH, "w"):
+            pass
+        start_timestamp = start_time.timestamp()
+        os.utime(LAST_SUCCESS_PATH, (start_timestamp, start_timestamp))
+    except Exception as e:
+        logger.warning(f"Konnte {LAST_SUCCESS_PATH} nicht schreiben: {e}")
 
 
 def create_backup(repo_config, directories):
     """
     Erstellt ein Borg-Backup in einem bestimmten Repository.
     directories: Liste von Pfaden, die in das Backup aufgenommen werden sollen.
+    Gibt ein Tupel (Erfolg, Archiv-Statistik) zurück. Erfolg ist True/False bzw. None,
+    falls nichts zu sichern war. Die Archiv-Statistik ist der "archive"-Teil der
+    JSON-Ausgabe von borg create (oder None, falls nicht verfügbar).
     """
-    global backup_success
-
     if not directories:
         logger.warning("Keine Verzeichnisse zum Sichern angegeben.")
-        return
+        return None, None
 
     repo_url = repo_config["repo_url"]
     passphrase = repo_config.get("passphrase")
@@ -455,87 +868,149 @@ def create_backup(repo_config, directories):
     logger.info(f"Erstelle Backup für Repository: {repo_url}")
     logger.info(f"  -> Archivname: {archive_name}")
 
-    # borg create
-    directories_str = " ".join(directories)
-    command = (
-        f"borg create --stats --compression lz4 "
-        f"{repo_url}::{archive_name} {directories_str}"
-    )
+    # borg create (--json gibt die Statistik maschinenlesbar auf stdout aus)
+    command = [
+        "borg", "create", "--json", "--compression", "lz4",
+        # ohne Inode: die ZFS-Snapshots werden bei jedem Lauf neu gemountet
+        "--files-cache=ctime,size",
+        f"{repo_url}::{archive_name}", *directories
+    ]
 
-    returncode, _, _ = run_command(command, passphrase=passphrase, ssh_key=ssh_key)
+    returncode, stdout, _ = run_command(
+        command, passphrase=passphrase, ssh_key=ssh_key, capture_stdout=True, log_label=repo_url
+    )
     if returncode != 0:
-        backup_success = False
-        backup_fail_reasons.append(f"Backup fehlgeschlagen für {repo_url}")
+        record_failure(f"Backup fehlgeschlagen für {repo_url}")
+        return False, None
+
+    try:
+        archive_stats = json.loads(stdout)["archive"]
+    except (ValueError, KeyError) as e:
+        logger.warning(f"Konnte die JSON-Ausgabe von borg create für {repo_url} nicht auswerten: {e}")
+        archive_stats = None
+    return True, archive_stats
 
 
-def verify_backups(repo_config):
+def determine_verify_data():
     """
-    Führt eine Integritätsprüfung (borg check) für das angegebene Repository durch.
+    Liest und erhöht den Laufzähler in VERIFY_COUNTER_PATH und entscheidet,
+    ob in diesem Lauf mit --verify-data geprüft wird (jeder VERIFY_DATA_EVERY_N_RUNS-te Lauf,
+    beginnend mit dem ersten).
     """
-    global backup_success
+    if VERIFY_DATA_EVERY_N_RUNS <= 0:
+        return False
+
+    counter = 0
+    try:
+        with open(VERIFY_COUNTER_PATH, "r") as cf:
+            counter = int(cf.read().strip() or 0)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Konnte Zähler {VERIFY_COUNTER_PATH} nicht lesen, starte bei 0: {e}")
+
+    verify_data = (counter % VERIFY_DATA_EVERY_N_RUNS == 0)
 
+    try:
+        with open(VERIFY_COUNTER_PATH, "w") as cf:
+            cf.write(str(counter + 1))
+    except Exception as e:
+        logger.warning(f"Konnte Zähler {VERIFY_COUNTER_PATH} nicht schreiben: {e}")
+
+    return verify_data
+
+
+def verify_backups(repo_config, verify_data):
+    """
+    Führt eine Integritätsprüfung (borg check) für das angegebene Repository durch.
+    Mit verify_data=True werden alle Datenblöcke verifiziert (--verify-data),
+    sonst wird nur das Repository geprüft (--repository-only).
+    Gibt True/False (Erfolg) zurück.
+    """
     repo_url = repo_config["repo_url"]
     passphrase = repo_config.get("passphrase")
     ssh_key = repo_config.get("ssh_key")
 
-    logger.info(f"Starte Repository-Check für: {repo_url}")
+    check_mode = "--verify-data" if verify_data else "--repository-only"
+    logger.info(f"Starte Repository-Check ({check_mode}) für: {repo_url}")
 
-    # borg check [--verify-data]
-    command = f"borg check {repo_url}"
-    if CHECK_WITH_VERIFY_DATA:
-        command += " --verify-data"
+    command = ["borg", "check", check_mode, repo_url]
 
-    returncode, _, _ = run_command(command, passphrase=passphrase, ssh_key=ssh_key)
+    returncode, _, _ = run_command(command, passphrase=passphrase, ssh_key=ssh_key, log_label=repo_url)
     if returncode != 0:
-        backup_success = False
-        backup_fail_reasons.append(f"Check fehlgeschlagen für {repo_url}")
+        record_failure(f"Check fehlgeschlagen für {repo_url}")
+        return False
+    return True
 
 
 def prune_backups(repo_config):
     """
     Löscht alte Backups nach den eingestellten Parametern (daily, weekly, monthly...).
+    Gibt True/False (Erfolg) zurück.
     """
-    global backup_success
-
     repo_url = repo_config["repo_url"]
     passphrase = repo_config.get("passphrase")
     ssh_key = repo_config.get("ssh_key")
 
     logger.info(f"Prune Backups für Repository: {repo_url}")
-    command = (
-        f"borg prune -v --list {repo_url} "
-        f"--keep-daily={PRUNE_KEEP_DAILY} "
-        f"--keep-weekly={PRUNE_KEEP_WEEKLY} "
-        f"--keep-monthly={PRUNE_KEEP_MONTHLY} "
+    command = [
+        "borg", "prune", "-v", "--list", repo_url,
+        f"--keep-daily={PRUNE_KEEP_DAILY}",
+        f"--keep-weekly={PRUNE_KEEP_WEEKLY}",
+        f"--keep-monthly={PRUNE_KEEP_MONTHLY}",
         f"--keep-yearly={PRUNE_KEEP_YEARLY}"
-    )
+    ]
 
-    returncode, _, _ = run_command(command, passphrase=passphrase, ssh_key=ssh_key)
+    returncode, _, _ = run_command(command, passphrase=passphrase, ssh_key=ssh_key, log_label=repo_url)
     if returncode != 0:
-        backup_success = False
-        backup_fail_reasons.append(f"Prune fehlgeschlagen für {repo_url}")
+        record_failure(f"Prune fehlgeschlagen für {repo_url}")
+        return False
+    return True
 
 
 def compact_repo(repo_config):
     """
     Führt borg compact durch, falls in den Einstellungen aktiviert.
+    Gibt True/False (Erfolg) zurück, None falls deaktiviert.
     """
-    global backup_success
-
     if not ENABLE_BORG_COMPACT:
-        return
+        return None
 
     repo_url = repo_config["repo_url"]
     passphrase = repo_config.get("passphrase")
     ssh_key = repo_config.get("ssh_key")
 
     logger.info(f"Borg-Compact für Repository: {repo_url}")
-    command = f"borg compact {repo_url}"
+    command = ["borg", "compact", repo_url]
 
-    returncode, _, _ = run_command(command, passphrase=passphrase, ssh_key=ssh_key)
+    returncode, _, _ = run_command(command, passphrase=passphrase, ssh_key=ssh_key, log_label=repo_url)
     if returncode != 0:
-        backup_success = False
-        backup_fail_reasons.append(f"Compact fehlgeschlagen für {repo_url}")
+        record_failure(f"Compact fehlgeschlagen für {repo_url}")
+        return False
+    return True
+
+
+def process_repository(repo_config, directories, verify_data):
+    """
+    Führt für ein Repository nacheinander Backup, Check, Prune und Compact aus.
+    borg sperrt das Repository bei jedem dieser Schritte exklusiv, daher laufen sie
+    innerhalb eines Repositories nacheinander. Verschiedene Repositories laufen
+    parallel (siehe run_for_all_repos) und warten nicht aufeinander.
+    Gibt ein Dict mit dem Status der einzelnen Schritte ("steps": True = erfolgreich,
+    False = fehlgeschlagen, None = nicht ausgeführt) und der Archiv-Statistik
+    von borg create ("archive_stats") zurück.
+    """
+    steps = {"create": None, "check": None, "prune": None, "compact": None}
+    archive_stats = None
+    try:
+        steps["create"], archive_stats = create_backup(repo_config, directories)
+        steps["check"] = verify_backups(repo_config, verify_data)
+        steps["prune"] = prune_backups(repo_config)
+        steps["compact"] = compact_repo(repo_config)
+    except Exception as e:
+        logger.exception(f"Unerwarteter Fehler bei Repository {repo_config['repo_url']}.")
+        record_failure(f"Unerwarteter Fehler bei Repository {repo_config['repo_url']}: {e}")
+    return {"steps": steps, "archive_stats": archive_stats}
 
 
 def garbage_collect_logs():
@@ -549,11 +1024,16 @@ def garbage_collect_logs():
 
     logger.info("Garbage Collect Logs: Prüfe alte Logdateien...")
 
-    pattern = os.path.join(LOG_DIR, f"{SCRIPT_NAME}_*.log")
-    log_files = glob.glob(pattern)
+    # Ein Verzeichnis-Durchlauf, ein stat() pro Logdatei
+    log_entries = []
+    with os.scandir(LOG_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(f"{SCRIPT_NAME}_") and entry.name.endswith(".log") and entry.is_file():
+                log_entries.append((entry.stat().st_mtime, entry.path))
 
-    # Sortieren nach Erstellungszeit (älteste zuerst)
-    log_files.sort(key=os.path.getmtime)
+    # Sortieren nach Änderungszeit (älteste zuerst)
+    log_entries.sort()
+    log_files = [path for _, path in log_entries]
 
     total_logs = len(log_files)
     if total_logs <= LOG_GARBAGE_KEEP:
@@ -571,12 +1051,36 @@ def garbage_collect_logs():
         except Exception as e:
             logger.error(f"Konnte Logdatei nicht löschen: {file_to_delete} -> {e}")
 
+def format_size(num_bytes):
+    """
+    Formatiert eine Byte-Anzahl menschenlesbar (z.B. "1.50 GB").
+    """
+    size = float(num_bytes)
+    for unit in ("B", "kB", "MB", "GB"):
+        if abs(size) < 1000:
+            return f"{size:.2f} {unit}"
+        size /= 1000
+    return f"{size:.2f} TB"
+
+
 def clear_temp_directory_contents():
     """
-    Removes only the contents of SCRIPT_TMP_DIR but not the directory itself.
+    Removes the per-run entries (TMP_DIR_RUN_ENTRIES) from SCRIPT_TMP_DIR.
+    Everything else (e.g. caches) is kept across runs. The lockfile is
+    left alone, only its flock is released by release_lock().
     """
     for filename in os.listdir(SCRIPT_TMP_DIR):
         path = os.path.join(SCRIPT_TMP_DIR, filename)
+        if filename not in TMP_DIR_RUN_ENTRIES or path == LOCKFILE_PATH:
+            continue
+        real_path = os.path.realpath(path)
+        mounts_below = [
+            mount_point for mount_point in read_zfs_mounts()
+            if mount_point == real_path or mount_point.startswith(real_path + os.sep)
+        ]
+        if mounts_below:
+            logger.error(f"Not removing {path}, snapshots are still mounted below it: {', '.join(mounts_below)}")
+            continue
         try:
             if os.path.isfile(path) or os.path.islink(path):
                 os.remove(path)
@@ -585,15 +1089,28 @@ def clear_temp_directory_contents():
         except Exception as e:
             logger.error(f"Error removing {path}: {e}")
 
-    logger.info("TMP directory contents cleared successfully.")
+    logger.info("TMP directory run entries cleared successfully.")
 
 
 # =============================================================================
 # ============================== HAUPTPROGRAMM ================================
 # =============================================================================
 
+def parse_arguments():
+    """
+    Liest die Kommandozeilen-Argumente ein.
+    """
+    parser = argparse.ArgumentParser(description="Automatisches Backup mit BorgBackup.")
+    parser.add_argument(
+        "--if-changed",
+        action="store_true",
+        help="Backup nur ausführen, wenn sich seit dem letzten erfolgreichen Lauf etwas geändert hat."
+    )
+    return parser.parse_args()
+
+
 def main():
-    global backup_success
+    args = parse_arguments()
 
     logfile_path = setup_logging()
 
@@ -611,15 +1128,35 @@ def main():
         release_lock()
         sys.exit(1)
 
+    # Persistenten Borg-Cache-Ordner anlegen (falls nicht vorhanden)
+    try:
+        os.makedirs(BORG_CACHE_DIR, exist_ok=True)
+    except Exception as e:
+        logger.warning(f"Konnte BORG_CACHE_DIR {BORG_CACHE_DIR} nicht erstellen: {e}")
+
+    # --if-changed: ohne Änderungen wird borg gar nicht erst aufgerufen
+    changed = True
+    if args.if_changed:
+        try:
+            changed = sources_changed()
+        except Exception:
+            logger.exception("Fehler bei der Änderungsprüfung, Backup wird ausgeführt.")
+    if not changed:
+        logger.info("Keine Änderungen seit dem letzten erfolgreichen Lauf. Backup wird übersprungen.")
+        # Übersprungene Läufe hinterlassen kein Log und lösen keine Log-Bereinigung aus,
+        # sonst würden sie die Logs der echten Backups aus LOG_GARBAGE_KEEP verdrängen.
+        discard_logfile(logfile_path)
+        release_lock()
+        return
+
     # ZFS-Snapshots erstellen und mounten (falls konfiguriert)
     zfs_snapshots = []
     try:
         if not zfs_empty:
-            zfs_snapshots = create_zfs_snapshots_and_mount(ZFS_POOLS)
+            zfs_snapshots = create_zfs_snapshots_and_mount(ZFS_POOLS, snapshot_index(ZFS_POOLS))
     except Exception as e:
         logger.exception("Fehler beim Anlegen/Mounten der ZFS-Snapshots.")
-        backup_fail_reasons.append(f"Fehler beim Anlegen/Mounten der ZFS-Snapshots: {e}")
-        backup_success = False
+        record_failure(f"Fehler beim Anlegen/Mounten der ZFS-Snapshots: {e}")
 
     # Directory-Liste für das Backup: reguläre Verzeichnisse + ggf. zfs-Verzeichnis
     all_backup_dirs = []
@@ -632,29 +1169,21 @@ def main():
         zfs_base_dir = os.path.join(SCRIPT_TMP_DIR, "zfs")
         all_backup_dirs.append(zfs_base_dir)
 
+    repo_results = {}
+    verify_data = False
     try:
-        # 1. Backup für jedes Repository erstellen
-        for repo in BORG_REPOSITORIES:
-            create_backup(repo, all_backup_dirs)
-
-        # 2. Verifizieren
-        for repo in BORG_REPOSITORIES:
-            verify_backups(repo)
+        # Check-Modus für diesen Lauf bestimmen
+        verify_data = determine_verify_data()
 
-        # 3. Prune
-        for repo in BORG_REPOSITORIES:
-            prune_backups(repo)
-
-        # 4. Optionales compact
-        for repo in BORG_REPOSITORIES:
-            compact_repo(repo)
+        # 1.-4. Backup, Verifizieren, Prune und optionales Compact.
+        # Die Repositories sind unabhängig voneinander und werden parallel bearbeitet.
+        repo_results = run_for_all_repos(process_repository, all_backup_dirs, verify_data)
 
         # 5. Log Garbage Collect
         garbage_collect_logs()
 
     except Exception as e:
-        backup_success = False
-        backup_fail_reasons.append(f"Unerwarteter Fehler im Skriptablauf: {e}")
+        record_failure(f"Unerwarteter Fehler im Skriptablauf: {e}")
         logger.exception("Unerwarteter Fehler aufgetreten.")
     finally:
         # Unmount und Zerstören der ZFS-Snapshots (falls vorhanden)
@@ -662,14 +1191,16 @@ def main():
             unmount_and_destroy_zfs_snapshots(zfs_snapshots)
         except Exception as e:
             logger.exception("Fehler beim Unmount/Destroy der ZFS-Snapshots.")
-            backup_fail_reasons.append(f"Fehler beim Unmount/Destroy: {e}")
-            backup_success = False
+            record_failure(f"Fehler beim Unmount/Destroy: {e}")
+
+        # Temp Directory Leeren (solange wir das Lock noch halten)
+        clear_temp_directory_contents()
 
-        # Lockfile entfernen
+        # Lock freigeben
         release_lock()
 
-        # Temp Directory Leeren
-        clear_temp_directory_contents()
+    if backup_success:
+        write_last_success()
 
     # Zusammenfassung
     end_time = datetime.datetime.now()
@@ -680,6 +1211,21 @@ def main():
     summary.append(f"Start: {start_time}")
     summary.append(f"Ende:  {end_time}")
     summary.append(f"Dauer: {duration}")
+    summary.append(f"Check-Modus: {'--verify-data' if verify_data else '--repository-only'}")
+
+    status_labels = {True: "OK", False: "FEHLER", None: "übersprungen"}
+    for repo_url, results in repo_results.items():
+        summary.append(f"Repository {repo_url}:")
+        for phase, result in results["steps"].items():
+            summary.append(f"  {phase}: {status_labels[result]}")
+        archive_stats = results["archive_stats"]
+        if archive_stats:
+            stats = archive_stats.get("stats", {})
+            summary.append(f"  Archiv: {archive_stats.get('name')}")
+            summary.append(f"    Dateien:       {stats.get('nfiles')}")
+            summary.append(f"    Originalgröße: {format_size(stats.get('original_size', 0))}")
+            summary.append(f"    Komprimiert:   {format_size(stats.get('compressed_size', 0))}")
+            summary.append(f"    Dedupliziert:  {format_size(stats.get('deduplicated_size', 0))}")
 
     if not backup_success:
         summary.append("Fehlerursachen:")